@@ -2,11 +2,19 @@
 # Author: Aayush Sisodia
 # Description: Gamified GAD-7 & PHQ-9 with mood tips + AI rewording into SITUATIONAL questions.
 # Run:
-#   python -m pip install streamlit openai
+#   python -m pip install streamlit "openai[aiohttp]"
 #   python -m streamlit run gamified_mental_health_bot.py
 
 import os
+import re
+import json
 import time
+import random
+import asyncio
+import threading
+from hashlib import blake2b
+from functools import lru_cache
+import numpy as np
 import streamlit as st
 
 # ---- API Key ----
@@ -18,14 +26,25 @@ if not API_KEY:
 # ---- SDK compatibility: supports openai==0.28.* and openai>=1.x ----
 USE_NEW_SDK = None
 try:
-    from openai import OpenAI  # >=1.x
-    client = OpenAI(api_key=API_KEY)
+    from openai import AsyncOpenAI, APITimeoutError, RateLimitError  # >=1.x
+    RETRYABLE_ERRORS = (RateLimitError, APITimeoutError)
+    try:
+        from openai import DefaultAioHttpClient  # usable only with openai[aiohttp]
+    except ImportError:
+        DefaultAioHttpClient = None
     USE_NEW_SDK = True
 except Exception:
     import openai  # 0.28 fallback
     openai.api_key = API_KEY
+    RETRYABLE_ERRORS = (openai.error.RateLimitError, openai.error.Timeout)
     USE_NEW_SDK = False
 
+# ---- Optional persistent cache (survives restarts and is shared across worker processes) ----
+try:
+    import diskcache
+except ImportError:
+    diskcache = None
+
 # ---- Page Setup ----
 st.set_page_config(page_title="Mental Health First Aid Bot", layout="centered")
 st.title("🧠 Mental Health First Aid Bot")
@@ -51,94 +70,419 @@ SCENARIO_TRIGGERS = [
     "with family", "on weekends"
 ]
 
+# One alternation scanned in a single pass instead of a substring search per trigger
+_SCENARIO_RE = re.compile("|".join(re.escape(t) for t in SCENARIO_TRIGGERS))
+
+@lru_cache(maxsize=2048)
 def _looks_situational(line: str) -> bool:
-    s = line.lower()
-    return any(t in s for t in SCENARIO_TRIGGERS) and ("?" in line)
-
-def _fewshot_messages(prompt: str, expected: int, stricter: bool = False):
-    style_rules = (
-        "Write FRIENDLY, SHORT questions (<= 20 words), each as a REAL-LIFE SITUATION.\n"
-        "Each line must start with a context clause (e.g., 'When…', 'Before bed…', 'At work…').\n"
-        "Avoid clinical/diagnostic words; keep the original meaning. One line per item. No numbering."
-    )
-    if stricter:
-        style_rules += "\nMAKE EVERY LINE SITUATIONAL. If a line is generic, rewrite it with a concrete context."
-
-    examples = [
-        "Before bed, do your thoughts spiral about little things?",
-        "At work or school, do small hassles set you on edge?",
-        "When plans change suddenly, do you feel tense or restless?",
-        "With friends, is it hard to enjoy what you used to?",
-        "Waking up, does the day feel heavy to start?"
+    return "?" in line and _SCENARIO_RE.search(line.lower()) is not None
+
+def _scenario_lines(lines) -> list[str]:
+    """Strip numbering/bullets and keep only situational lines, in order."""
+    cleaned = [str(ln).strip().lstrip("0123456789.)-–— •").strip() for ln in lines if str(ln).strip()]
+    return [q for q in cleaned if len(q) > 10 and _looks_situational(q)]
+
+# Kept deliberately terse: this text is sent on every attempt, so each word is paid for repeatedly.
+STYLE_EXAMPLES = [
+    "Before bed, do your thoughts spiral about little things?",
+    "With friends, is it hard to enjoy what you used to?",
+]
+
+STYLE_RULES = ("Friendly, ≤20 words, keep meaning, no clinical words; start with a context clause "
+               "(When…/At work…/Before bed…); no numbering.")
+
+# Byte-identical across every request (no per-call interpolation) so OpenAI's automatic
+# prompt caching can reuse it; anything task-specific goes in the trailing user message.
+SYSTEM_PROMPT = (
+    "You convert validated screening items into brief, friendly, SITUATION-BASED questions that preserve meaning.\n"
+    f"{STYLE_RULES}\n\n"
+    "Examples:\n- " + "\n- ".join(STYLE_EXAMPLES)
+)
+
+def _fewshot_messages(prompt: str, expected: int):
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user",
+         "content": (
+            f"Task:\n{prompt}\n"
+            f'Return JSON: {{"items": [{{"q": "..."}}]}} with exactly {expected} items.'
+         )},
     ]
+
+def _batch_messages(specs: dict[str, tuple[str, int]]):
+    """One request covering every screener; the model answers with a JSON object keyed like `specs`."""
+    shape = ", ".join(f'"{key}": [{expected} lines]' for key, (_, expected) in specs.items())
+    tasks = "\n\n".join(f'Task "{key}":\n{prompt}' for key, (prompt, _) in specs.items())
     return [
-        {"role": "system",
-         "content": "You convert validated screening items into brief, friendly, SITUATION-BASED questions that preserve meaning."},
+        {"role": "system", "content": SYSTEM_PROMPT},
         {"role": "user",
          "content": (
-            f"{style_rules}\n\n"
-            f"Examples (style only):\n- " + "\n- ".join(examples) +
-            f"\n\nTask:\n{prompt}\n"
-            f"Return exactly {expected} lines. No bullets, no numbering, no extra commentary."
+            f"{tasks}\n\n"
+            f"Return JSON: {{{shape}}}. Each value is a list of question strings, no numbering."
          )},
     ]
 
-def ai_generate_questions(prompt: str, defaults: list[str], model_candidates=None, force_refresh=False):
+@st.cache_resource
+def _event_loop() -> asyncio.AbstractEventLoop:
+    """One long-lived loop on a daemon thread; the pooled client below is bound to it."""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True, name="openai-loop").start()
+    return loop
+
+def _run(coro):
+    """Runs a coroutine on the shared loop and blocks the script thread for its result."""
+    return asyncio.run_coroutine_threadsafe(coro, _event_loop()).result()
+
+REQUEST_TIMEOUT = 20.0  # seconds per HTTP request; the SDK default (600s) would hang the page
+
+async def _make_client():
+    if not USE_NEW_SDK:
+        import aiohttp  # openai 0.28 already depends on it
+        return aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT))
+    # max_retries=0: _with_backoff owns retries, so the SDK's own schedule mustn't stack on top
+    options = {"api_key": API_KEY, "max_retries": 0, "timeout": REQUEST_TIMEOUT}
+    if DefaultAioHttpClient is not None:
+        try:
+            return AsyncOpenAI(http_client=DefaultAioHttpClient(), **options)
+        except RuntimeError:
+            pass  # recent SDKs export a stub that raises when the [aiohttp] extra is missing
+    return AsyncOpenAI(**options)
+
+@st.cache_resource
+def get_client():
+    """
+    Shared client reused across reruns and sessions, so the connection pool and TLS
+    state survive widget interactions. AsyncOpenAI (aiohttp transport when available)
+    on >=1.x; on 0.28 the aiohttp session handed to openai.aiosession.
+    """
+    return _run(_make_client())
+
+def _client_or_raise():
+    """get_client(), with setup failures reported as QuestionGenerationError (→ default questions)."""
+    try:
+        return get_client()
+    except Exception as e:
+        raise QuestionGenerationError({"used_model": None, "ai_ok": False, "reason": f"client setup failed: {e}"})
+
+def _bind_client(client):
+    """0.28 reads its aiohttp session from a ContextVar, so set it inside each coroutine run."""
+    if not USE_NEW_SDK:
+        openai.aiosession.set(client)
+    return client
+
+async def _complete(client, model_name: str, messages, **kwargs) -> tuple[str, str | None]:
+    """(completion text, finish_reason) from either SDK."""
+    if USE_NEW_SDK:
+        resp = await client.chat.completions.create(model=model_name, messages=messages, **kwargs)
+        return resp.choices[0].message.content or "", resp.choices[0].finish_reason
+    resp = await openai.ChatCompletion.acreate(model=model_name, messages=messages, **kwargs)
+    return resp["choices"][0]["message"]["content"] or "", resp["choices"][0].get("finish_reason")
+
+def _truncation_note(finish_reason: str | None) -> str:
+    return " (truncated at max_tokens)" if finish_reason == "length" else ""
+
+MAX_RETRIES = 3  # backoff waits ~1s, 2s, 4s (±50% jitter)
+
+async def _with_backoff(call):
+    """Awaits call(), retrying only rate-limit/timeout errors with exponential backoff + jitter."""
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            return await call()
+        except RETRYABLE_ERRORS:
+            if attempt == MAX_RETRIES:
+                raise
+            await asyncio.sleep(min(8, 2 ** attempt) * (0.5 + random.random()))
+
+# Output budget: a ≤20-word question is ~27 tokens, plus ~8 for its {"q": "..."} framing,
+# plus a fixed allowance per JSON object/section. Tight, but long items must still fit.
+TOKENS_PER_ITEM = 36
+JSON_OVERHEAD_TOKENS = 16
+
+async def _attempt(client, model_name: str, prompt: str, expected: int) -> tuple[list[str], dict]:
+    """One JSON-mode attempt; never raises, failures are reported through meta."""
+    finish_reason = None
+    try:
+        content, finish_reason = await _with_backoff(lambda: _complete(
+            client, model_name, _fewshot_messages(prompt, expected),
+            temperature=TEMPERATURE, max_tokens=expected * TOKENS_PER_ITEM + JSON_OVERHEAD_TOKENS,
+            response_format={"type": "json_object"},
+        ))
+        data = json.loads(content or "{}")
+    except Exception as e:
+        return [], {"used_model": model_name, "ai_ok": False,
+                    "reason": f"error: {e}{_truncation_note(finish_reason)}"}
+    items = data.get("items") if isinstance(data, dict) else None
+    items = items if isinstance(items, list) else []
+    questions = _scenario_lines(item.get("q", "") if isinstance(item, dict) else item for item in items)[:expected]
+    if len(questions) == expected:
+        return questions, {"used_model": model_name, "ai_ok": True, "reason": "scenario-ok"}
+    return questions, {"used_model": model_name, "ai_ok": False,
+                       "reason": f"got {len(questions)} valid scenario items{_truncation_note(finish_reason)}"}
+
+async def _race(attempts, accept):
+    """
+    Runs the (never-raising) attempt coroutines concurrently and returns the first result
+    accept() approves, cancelling the rest; otherwise the last one to finish.
+    With a single model (the default) this is just one awaited call.
+    """
+    pending = {asyncio.create_task(attempt) for attempt in attempts}
+    result = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = task.result()
+                if accept(result):
+                    return result
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    return result
+
+async def _agen(client, prompt: str, expected: int, models: tuple[str, ...]) -> tuple[list[str] | None, dict]:
+    """Races one attempt per model; the first valid result wins and the rest are cancelled."""
+    client = _bind_client(client)
+    questions, meta = await _race([_attempt(client, model_name, prompt, expected) for model_name in models],
+                                  lambda result: result[1]["ai_ok"])
+    return (questions if meta["ai_ok"] else None), meta
+
+DEFAULT_MODELS = ("gpt-4.1-nano",)  # a short rewrite doesn't need a bigger model
+TEMPERATURE = 0.2  # near-deterministic output: fewer invalid retries, steadier token counts
+AI_CACHE_TTL = 24 * 60 * 60  # prompts are static, so a day-long cache is safe
+AI_CACHE_MAX_ENTRIES = 64  # each Regenerate adds one entry under its refresh token
+AI_FAILURE_TTL = 60  # seconds a session shows defaults before retrying a failed rewrite
+
+class QuestionGenerationError(Exception):
+    """
+    Raised inside the cached fetchers so st.cache_data never stores a failed rewrite.
+    Batch failures also carry the sections that did validate (results), a reason per
+    failed section, and which of those failed on the API call itself (unavailable).
+    """
+    def __init__(self, meta: dict, reasons: dict | None = None, results: dict | None = None,
+                 unavailable: frozenset = frozenset()):
+        super().__init__(meta["reason"])
+        self.meta = meta
+        self.reasons = reasons or {}
+        self.results = results or {}
+        self.unavailable = unavailable
+
+@st.cache_resource
+def _disk_cache():
+    """diskcache store under .ai_cache, or None when diskcache isn't installed or can't open it."""
+    if diskcache is None:
+        return None
+    try:
+        return diskcache.Cache(".ai_cache")
+    except Exception:  # e.g. read-only working directory
+        return None
+
+def _disk_key(prompt: str, expected: int, models: tuple[str, ...]) -> str:
+    # Stable across processes, unlike the per-process salted hash()
+    return blake2b(f"{prompt}|{expected}|{','.join(models)}".encode(), digest_size=16).hexdigest()
+
+def _disk_get(prompt: str, expected: int, models: tuple[str, ...]):
+    disk = _disk_cache()
+    if disk is None:
+        return None
+    try:
+        return disk.get(_disk_key(prompt, expected, models))
+    except Exception:  # the persistent layer is best-effort
+        return None
+
+def _disk_set(prompt: str, expected: int, models: tuple[str, ...], result: tuple[list[str], dict]):
+    """Only validated AI output is persisted; fallbacks are retried after a restart."""
+    disk = _disk_cache()
+    if disk is None:
+        return
+    try:
+        disk.set(_disk_key(prompt, expected, models), result, expire=AI_CACHE_TTL)
+    except Exception:
+        pass
+
+@st.cache_data(ttl=AI_CACHE_TTL, max_entries=AI_CACHE_MAX_ENTRIES, show_spinner=False)
+def _fetch_questions(prompt: str, expected: int, models: tuple[str, ...] = DEFAULT_MODELS,
+                     refresh_token: str = "") -> tuple[list[str], dict]:
+    """
+    Network + validation core, shared by every session. Must stay free of st.* calls:
+    cached functions replay their elements on a hit. Raises QuestionGenerationError
+    when no attempt validates, so only successes are cached.
+    A non-empty refresh_token skips the disk layer entirely: a Regenerate result lives only
+    under its token in memory and never replaces the shared persisted questions.
+    """
+    hit = None if refresh_token else _disk_get(prompt, expected, models)
+    if hit is not None:
+        return hit
+
+    questions, meta = _run(_agen(_client_or_raise(), prompt, expected, models))
+    if questions:
+        if not refresh_token:
+            _disk_set(prompt, expected, models, (questions, meta))
+        return questions, meta
+
+    raise QuestionGenerationError(meta)
+
+def _recent_failure(prompt: str, refresh_token: str) -> dict | None:
+    """meta of this session's failed rewrite of prompt, if it failed within AI_FAILURE_TTL."""
+    failed = st.session_state.get("ai_failures", {}).get((refresh_token, prompt))
+    if failed is not None and time.monotonic() - failed[0] < AI_FAILURE_TTL:
+        return failed[1]
+    return None
+
+def _remember_failure(prompt: str, refresh_token: str, meta: dict):
+    # Per session, unlike st.cache_data: one user's outage never pins defaults for everyone
+    st.session_state.setdefault("ai_failures", {})[(refresh_token, prompt)] = (time.monotonic(), meta)
+
+def ai_generate_questions(prompt: str, defaults: list[str], model_candidates=None, refresh_token: str = ""):
     """
     Returns (questions, meta) with enforced situational style.
-    Tries cheap model first, then stronger fallbacks. Caches per prompt.
+    Uses gpt-4.1-nano unless model_candidates are given (several are raced, first valid wins).
+    Cached per prompt across all sessions;
+    a new refresh_token forces a fresh rewrite (reuse it on later reruns to hit that result).
     meta = {"used_model": str|None, "ai_ok": bool, "reason": str}
     """
-    expected = len(defaults)
-    models = model_candidates or ["gpt-4.1-nano", "gpt-4o-mini", "gpt-3.5-turbo"]
-
-    cache_key = f"ai_q::{hash(prompt)}::{expected}"
-    if not force_refresh and cache_key in st.session_state:
-        return st.session_state[cache_key]
-
-    meta = {"used_model": None, "ai_ok": False, "reason": "not attempted"}
-
-    for model_name in models:
-        for strict in (False, True):  # try normal few-shot, then strict enforcement
-            try:
-                if USE_NEW_SDK:
-                    resp = client.chat.completions.create(
-                        model=model_name,
-                        messages=_fewshot_messages(prompt, expected, stricter=strict),
-                        temperature=0.7, max_tokens=600,
-                    )
-                    content = (resp.choices[0].message.content or "").strip()
-                else:
-                    content = (openai.ChatCompletion.create(
-                        model=model_name,
-                        messages=_fewshot_messages(prompt, expected, stricter=strict),
-                        temperature=0.7, max_tokens=600,
-                    )["choices"][0]["message"]["content"] or "").strip()
-
-                lines = [ln.strip() for ln in content.split("\n") if ln.strip()]
-                cleaned = [ln.lstrip("0123456789.)-–— •").strip() for ln in lines]
-                scenario_lines = [q for q in cleaned if len(q) > 10 and _looks_situational(q)]
-                questions = scenario_lines[:expected]
-
-                if len(questions) == expected:
-                    meta = {"used_model": model_name, "ai_ok": True, "reason": f"scenario-ok (strict={strict})"}
-                    st.session_state[cache_key] = (questions, meta)
-                    return questions, meta
-
-                meta = {"used_model": model_name, "ai_ok": False,
-                        "reason": f"got {len(questions)} valid scenario lines (strict={strict})"}
-                time.sleep(0.2)  # tiny backoff
-            except Exception as e:
-                meta = {"used_model": model_name, "ai_ok": False, "reason": f"error: {e}"}
-                continue
-
-    # All attempts failed → soft scenario-ize defaults
-    fixed_defaults = []
-    for q in defaults:
-        fixed_defaults.append(q if _looks_situational(q) else f"When you think about your day, {q.rstrip('?')}?")
-    result = (fixed_defaults, meta)
-    st.session_state[cache_key] = result
-    return result
+    failed = _recent_failure(prompt, refresh_token)
+    if failed is not None:
+        return list(defaults), failed
+    models = tuple(model_candidates or DEFAULT_MODELS)
+    try:
+        return _fetch_questions(prompt, len(defaults), models, refresh_token)
+    except QuestionGenerationError as e:
+        # All attempts failed → defaults (already situational); this session retries after AI_FAILURE_TTL
+        _remember_failure(prompt, refresh_token, e.meta)
+        return list(defaults), e.meta
+
+@st.cache_data(ttl=AI_CACHE_TTL, max_entries=AI_CACHE_MAX_ENTRIES, show_spinner=False)
+def _fetch_questions_batch(specs: tuple[tuple[str, str, int], ...], models: tuple[str, ...] = DEFAULT_MODELS,
+                           refresh_token: str = "") -> tuple[dict, dict]:
+    """
+    One JSON-mode completion for every (key, prompt, expected) in specs.
+    Returns ({key: (questions, meta)} for sections that validated, {key: reason} for the rest).
+    Raises QuestionGenerationError when no section validated or any section failed on the
+    API call, so neither is cached; a partial result is, since its invalid sections go
+    through the uncached-on-failure per-screener path anyway.
+    """
+    results = {}
+    reasons = {}
+    unavailable = frozenset()
+    remaining = []
+    for key, prompt, expected in specs:
+        hit = None if refresh_token else _disk_get(prompt, expected, models)
+        if hit is not None:
+            results[key] = hit
+        else:
+            remaining.append((key, prompt, expected))
+
+    if remaining:
+        fetched, reasons, unavailable = _run(_abatch(_client_or_raise(), tuple(remaining), models))
+        for key, prompt, expected in remaining:
+            if key in fetched and not refresh_token:
+                _disk_set(prompt, expected, models, fetched[key])
+        results.update(fetched)
+    if not results or unavailable:
+        raise QuestionGenerationError(
+            {"used_model": None, "ai_ok": False, "reason": "batch failed"}, reasons, results, unavailable)
+    return results, reasons
+
+async def _abatch(client, specs: tuple[tuple[str, str, int], ...],
+                  models: tuple[str, ...]) -> tuple[dict, dict, frozenset]:
+    """
+    Races one batched attempt per model, like _agen; each section keeps the first result
+    that validates it, and the stragglers are cancelled once every section is covered.
+    Returns (results, reasons, unavailable): unavailable holds the unresolved keys when
+    every model's call failed on the API rather than on validation.
+    """
+    pending = {key: (prompt, expected) for key, prompt, expected in specs}
+    results = {}
+    reasons = {key: "not attempted" for key in pending}
+    answered = False
+
+    def merge(attempt) -> bool:
+        nonlocal answered
+        results_for_model, reasons_for_model, error = attempt
+        answered = answered or error is None
+        for key, result in results_for_model.items():
+            results.setdefault(key, result)
+        reasons.update(reasons_for_model)
+        return len(results) == len(pending)
+
+    client = _bind_client(client)
+    await _race([_batch_attempt(client, model_name, pending) for model_name in models], merge)
+    for key in results:
+        reasons.pop(key, None)
+    unavailable = frozenset() if answered else frozenset(pending.keys() - results.keys())
+    return results, reasons, unavailable
+
+async def _batch_attempt(client, model_name: str,
+                         pending: dict[str, tuple[str, int]]) -> tuple[dict, dict, Exception | None]:
+    """
+    One batched call; returns the sections that validated, a failure reason for the others,
+    and the exception when the call itself failed (None when it only failed validation).
+    """
+    results = {}
+    reasons = {}
+    total = sum(expected for _, expected in pending.values())
+    try:
+        content, finish_reason = await _with_backoff(lambda: _complete(
+            client, model_name, _batch_messages(pending),
+            temperature=TEMPERATURE, max_tokens=total * TOKENS_PER_ITEM + JSON_OVERHEAD_TOKENS * len(pending),
+            response_format={"type": "json_object"},
+        ))
+    except Exception as e:
+        return results, {key: f"batch error: {e}" for key in pending}, e
+    try:
+        data = json.loads(content or "{}")
+    except ValueError:
+        return results, {key: f"batch returned invalid JSON{_truncation_note(finish_reason)}"
+                         for key in pending}, None
+
+    for key, (prompt, expected) in pending.items():
+        section = data.get(key) if isinstance(data, dict) else None
+        questions = _scenario_lines(section if isinstance(section, list) else [])[:expected]
+        if len(questions) == expected:
+            results[key] = (questions, {"used_model": model_name, "ai_ok": True,
+                                        "reason": f"scenario-ok (batched {total} items)"})
+        else:
+            reasons[key] = f"batch got {len(questions)} valid scenario lines{_truncation_note(finish_reason)}"
+    return results, reasons, None
+
+def ai_generate_questions_batch(specs: dict[str, tuple[str, list[str]]], model_candidates=None,
+                                refresh_token: str = ""):
+    """
+    Rewrites several screeners with ONE chat completion (JSON object keyed like `specs`).
+    specs = {key: (prompt, defaults)}; returns {key: (questions, meta)}.
+    Sections that fail validation fall back to `ai_generate_questions` individually;
+    sections whose API call failed (rate limit, timeout, …) get their defaults directly.
+    """
+    models = tuple(model_candidates or DEFAULT_MODELS)
+    results, reasons, unavailable = {}, {}, frozenset()
+    for key, (prompt, defaults) in specs.items():
+        failed = _recent_failure(prompt, refresh_token)
+        if failed is not None:
+            results[key] = (list(defaults), failed)
+    to_fetch = tuple((key, prompt, len(defaults)) for key, (prompt, defaults) in specs.items() if key not in results)
+    if to_fetch:
+        try:
+            fetched, reasons = _fetch_questions_batch(to_fetch, models, refresh_token)
+        except QuestionGenerationError as e:
+            fetched, reasons, unavailable = e.results, e.reasons, e.unavailable
+        results.update(fetched)
+
+    # Per-section fallback for anything the batched call couldn't satisfy
+    for key, (prompt, defaults) in specs.items():
+        if key in results:
+            continue
+        if key in unavailable:
+            # Per-screener calls would hit the same failing API, each with its own backoff
+            meta = {"used_model": None, "ai_ok": False, "reason": reasons[key]}
+            _remember_failure(prompt, refresh_token, meta)
+            results[key] = (list(defaults), meta)
+            continue
+        questions, meta = ai_generate_questions(prompt, defaults, models, refresh_token)
+        if not meta["ai_ok"]:
+            meta = {**meta, "reason": f"{meta['reason']} (after {reasons.get(key, 'batch failed')})"}
+        results[key] = (questions, meta)
+    return results
 
 # -------------------------
 # Mood Check + Suggestions
@@ -170,108 +514,149 @@ score_map = {
     "😟 Nearly every day": 3,
 }
 emoji_options = list(score_map.keys())
+SCORE_LUT = np.array(list(score_map.values()), dtype=np.int8)
+EMOJI_IDX = {emoji: i for i, emoji in enumerate(emoji_options)}
 
-# Regenerate button to force fresh AI output
-regen = st.button("🔄 Regenerate AI questions")
+def _screener_score(prefix: str, n_items: int) -> int:
+    """Sums the submitted slider answers `{prefix}_0..n-1` via one LUT gather."""
+    idx = np.fromiter((EMOJI_IDX[st.session_state[f"{prefix}_{i}"]] for i in range(n_items)),
+                      dtype=np.int8, count=n_items)
+    return int(SCORE_LUT.take(idx).sum())
 
-# -------------------------
-#           GAD-7
-# -------------------------
-st.header("😰 GAD-7 (Anxiety Screener)")
 gad_prompt = (
     "Rewrite the 7 GAD-7 items as CONCRETE, REAL-LIFE SITUATIONS. "
     "Each line must start with a context like 'At work…', 'Before bed…', 'In public…', "
     "'With friends…', 'During class…', 'On your commute…'. Keep meaning; ≤20 words; one line per item."
 )
-gad_defaults = [
-    "You’re at work or school and feel your chest tighten. How often does that happen?",
-    "You worry even when everything seems fine. How often does this happen?",
-    "You stay up late thinking about the worst that could happen. How often is this true?",
-    "You notice your muscles tensing or struggle to relax. How often do you feel that?",
-    "You fidget a lot or can’t sit still. How frequently does this affect you?",
-    "You snap at small things more than usual. How often is this true?",
-    "You avoid plans or places out of worry. How often do you do that?",
+# Vetted situational rewrites, generated offline and shipped so the default page makes no API call.
+PRECOMPUTED_GAD = [
+    "At work or school, do you feel nervous, anxious, or on edge?",
+    "Before bed, is it hard to stop or control your worrying?",
+    "When you think about your day, do you worry too much about different things?",
+    "At home in the evening, do you have trouble relaxing?",
+    "In a meeting or in class, do you feel so restless it’s hard to sit still?",
+    "With friends or family, do you get annoyed or irritable more easily than usual?",
+    "On your commute, do you feel afraid that something awful might happen?",
 ]
-gad_questions, gad_meta = ai_generate_questions(gad_prompt, gad_defaults, force_refresh=regen)
-
-with st.expander("ℹ️ AI status (GAD-7)"):
-    st.write("Model used:", gad_meta.get("used_model"))
-    st.write("AI output accepted:", gad_meta.get("ai_ok"))
-    st.write("Reason:", gad_meta.get("reason"))
-
-gad_score = 0
-for i, q in enumerate(gad_questions):
-    response = st.select_slider(f"{i+1}. {q}", options=emoji_options, key=f"gad_{i}")
-    gad_score += score_map[response]
-
-# -------------------------
-#           PHQ-9
-# -------------------------
-st.header("😔 PHQ-9 (Depression Screener)")
 phq_prompt = (
     "Rewrite the 9 PHQ-9 items as CONCRETE, REAL-LIFE SITUATIONS. "
     "Each line must start with a context like 'Waking up…', 'When plans fall through…', 'On weekends…', "
     "'During chores…', 'While studying…', 'With family…'. Keep meaning; ≤20 words; one line per item."
 )
-phq_defaults = [
-    "You used to enjoy certain things—how interested are you in them lately?",
-    "Do mornings feel heavy, like starting the day takes extra effort?",
-    "Has your sleep been off—too much or too little?",
-    "How often do you feel tired or low on energy?",
-    "Has your appetite changed—eating more or less than usual?",
-    "Do you find yourself feeling guilty or putting yourself down more often?",
-    "Is it harder to focus on reading, shows, or conversations?",
-    "Have you felt slowed down or, the opposite, unusually restless?",
-    "Have you had thoughts that life isn’t worth it or that you’d be better off gone?",
+PRECOMPUTED_PHQ = [
+    "On weekends, do you have little interest or pleasure in things you used to enjoy?",
+    "Waking up, do you feel down, depressed, or hopeless?",
+    "Before bed, do you struggle to fall or stay asleep, or do you sleep too much?",
+    "During chores, do you feel tired or have little energy?",
+    "When you sit down to eat, do you have a poor appetite or find yourself overeating?",
+    "When something goes wrong, do you feel bad about yourself or like you’ve let people down?",
+    "While reading or watching a show, do you have trouble concentrating?",
+    "With family or friends, have you been moving or speaking slowly, or been unusually restless?",
+    "When things feel heavy, do you have thoughts that you’d be better off dead or of hurting yourself?",
 ]
-phq_questions, phq_meta = ai_generate_questions(phq_prompt, phq_defaults, force_refresh=regen)
-
-with st.expander("ℹ️ AI status (PHQ-9)"):
-    st.write("Model used:", phq_meta.get("used_model"))
-    st.write("AI output accepted:", phq_meta.get("ai_ok"))
-    st.write("Reason:", phq_meta.get("reason"))
-
-phq_score = 0
-for i, q in enumerate(phq_questions):
-    response = st.select_slider(f"{i+1}. {q}", options=emoji_options, key=f"phq_{i}")
-    phq_score += score_map[response]
-
-# ---- Progress ----
-total_possible = 21 + 27
-user_score = gad_score + phq_score
-st.progress(user_score / total_possible, text="🎯 Scoring your mental wellness check...")
-
-# ---- Results ----
-st.subheader(f"📊 GAD-7 Score: {gad_score}/21")
-if gad_score <= 4:
-    st.success("Minimal anxiety")
-elif gad_score <= 9:
-    st.info("Mild anxiety")
-elif gad_score <= 14:
-    st.warning("Moderate anxiety — consider professional support.")
-else:
-    st.error("Severe anxiety — please seek help.")
-
-st.subheader(f"📊 PHQ-9 Score: {phq_score}/27")
-if phq_score <= 4:
-    st.success("Minimal depression")
-elif phq_score <= 9:
-    st.info("Mild depression")
-elif phq_score <= 14:
-    st.warning("Moderate depression — consider support.")
-elif phq_score <= 19:
-    st.warning("Moderately severe depression — therapy recommended.")
-else:
-    st.error("Severe depression — seek help immediately.")
-
-# ---- Badge ----
-st.header("🏅 Your Self-Care Badge")
-if phq_score < 10 and gad_score < 10:
-    st.success("✅ **Mindful Mover Badge** — keep up the self-care!")
-elif 10 <= phq_score < 15 or 10 <= gad_score < 15:
-    st.warning("🌱 **Resilience Builder Badge** — you’re showing strength.")
-else:
-    st.error("🛡️ **Courageous Warrior Badge** — you’re fighting hard. Please talk to someone.")
+
+def _request_fresh_questions():
+    """Regenerate callback: runs before the rerun, so it may set the toggle's state."""
+    st.session_state["use_ai_questions"] = True
+    # New token → fresh rewrite for this session only; shared cached questions stay untouched
+    st.session_state["ai_refresh_token"] = f"{random.getrandbits(64):x}"
+
+# Screeners load on demand: the page above paints immediately, and question
+# fetching, the form and scoring only run for users who choose to continue.
+if not st.session_state.get("screening_started") and st.button("📝 Start screening"):
+    st.session_state["screening_started"] = True
+
+if st.session_state.get("screening_started"):
+    # The toggle reads the shared caches (usually no API call); Regenerate forces a fresh rewrite.
+    # With the toggle off, the precomputed questions render immediately with no network I/O.
+    use_ai = st.toggle("✨ Personalize questions with AI", key="use_ai_questions")
+    st.button("🔄 Regenerate AI questions", on_click=_request_fresh_questions)
+
+    if use_ai:
+        # One batched request rewrites both screeners (falls back per screener if needed)
+        with st.spinner("Personalizing questions..."):
+            ai_results = ai_generate_questions_batch(
+                {"gad": (gad_prompt, PRECOMPUTED_GAD), "phq": (phq_prompt, PRECOMPUTED_PHQ)},
+                refresh_token=st.session_state.get("ai_refresh_token", ""),
+            )
+    else:
+        precomputed_meta = {"used_model": None, "ai_ok": False, "reason": "precomputed questions (no API call)"}
+        ai_results = {"gad": (PRECOMPUTED_GAD, precomputed_meta), "phq": (PRECOMPUTED_PHQ, precomputed_meta)}
+    gad_questions, gad_meta = ai_results["gad"]
+    phq_questions, phq_meta = ai_results["phq"]
+
+    # Sliders live in one form so moving them doesn't rerun the whole script;
+    # everything is submitted (and scored) together.
+    with st.form("screeners"):
+        # -------------------------
+        #           GAD-7
+        # -------------------------
+        st.header("😰 GAD-7 (Anxiety Screener)")
+        with st.expander("ℹ️ AI status (GAD-7)"):
+            st.write("Model used:", gad_meta.get("used_model"))
+            st.write("AI output accepted:", gad_meta.get("ai_ok"))
+            st.write("Reason:", gad_meta.get("reason"))
+
+        for i, q in enumerate(gad_questions):
+            st.select_slider(f"{i+1}. {q}", options=emoji_options, key=f"gad_{i}")
+
+        # -------------------------
+        #           PHQ-9
+        # -------------------------
+        st.header("😔 PHQ-9 (Depression Screener)")
+        with st.expander("ℹ️ AI status (PHQ-9)"):
+            st.write("Model used:", phq_meta.get("used_model"))
+            st.write("AI output accepted:", phq_meta.get("ai_ok"))
+            st.write("Reason:", phq_meta.get("reason"))
+
+        for i, q in enumerate(phq_questions):
+            st.select_slider(f"{i+1}. {q}", options=emoji_options, key=f"phq_{i}")
+
+        submit = st.form_submit_button("Score me")
+
+    if submit:
+        st.session_state["screeners_submitted"] = True
+
+    if st.session_state.get("screeners_submitted"):
+        gad_score = _screener_score("gad", len(gad_questions))
+        phq_score = _screener_score("phq", len(phq_questions))
+
+        # ---- Progress ----
+        total_possible = 21 + 27
+        user_score = gad_score + phq_score
+        st.progress(user_score / total_possible, text="🎯 Scoring your mental wellness check...")
+
+        # ---- Results ----
+        st.subheader(f"📊 GAD-7 Score: {gad_score}/21")
+        if gad_score <= 4:
+            st.success("Minimal anxiety")
+        elif gad_score <= 9:
+            st.info("Mild anxiety")
+        elif gad_score <= 14:
+            st.warning("Moderate anxiety — consider professional support.")
+        else:
+            st.error("Severe anxiety — please seek help.")
+
+        st.subheader(f"📊 PHQ-9 Score: {phq_score}/27")
+        if phq_score <= 4:
+            st.success("Minimal depression")
+        elif phq_score <= 9:
+            st.info("Mild depression")
+        elif phq_score <= 14:
+            st.warning("Moderate depression — consider support.")
+        elif phq_score <= 19:
+            st.warning("Moderately severe depression — therapy recommended.")
+        else:
+            st.error("Severe depression — seek help immediately.")
+
+        # ---- Badge ----
+        st.header("🏅 Your Self-Care Badge")
+        if phq_score < 10 and gad_score < 10:
+            st.success("✅ **Mindful Mover Badge** — keep up the self-care!")
+        elif 10 <= phq_score < 15 or 10 <= gad_score < 15:
+            st.warning("🌱 **Resilience Builder Badge** — you’re showing strength.")
+        else:
+            st.error("🛡️ **Courageous Warrior Badge** — you’re fighting hard. Please talk to someone.")
 
 st.markdown("---")
 st.caption("📌 This tool doesn’t diagnose conditions. For professional help, contact a licensed provider.")